@@ -5,6 +5,11 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Timeout cap for one Gemini call under a deadline (seconds); shrinks to the time left
+GEMINI_TIMEOUT = 60
+# Time kept back for Gemini while fetching under a deadline (seconds)
+GEMINI_RESERVE = 15
+
 def get_gemini_client():
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
@@ -17,9 +22,10 @@ def get_gemini_client():
         raise ValueError("GEMINI_API_KEY not found. Please set it in .env (local) or Streamlit Secrets (cloud).")
     return genai.Client(api_key=api_key)
 
-def analyze_video(transcript, comments, video_metadata, target_language="Auto"):
+def analyze_video(transcript, comments, video_metadata, target_language="Auto", deadline=None):
     """
     Analyzes the video transcript and comments using Gemini.
+    The request timeout is sized from `deadline` when given.
     """
     client = get_gemini_client()
     
@@ -62,10 +68,58 @@ def analyze_video(transcript, comments, video_metadata, target_language="Auto"):
     What is the overall sentiment of the video? What are people saying? Is it positive, negative, controversial, funny, educational? Summarize the general "vibe" of the audience reaction, again giving more weight to highly liked comments.
     """
     
+    return _generate(client, prompt, deadline)
+
+def update_analysis(previous_report, new_comments, video_metadata, target_language="Auto", deadline=None):
+    """
+    Updates a previous vibe report with the comments posted since it was written.
+    Only the report and the new comments are sent, not the transcript or the
+    full comment set, so a refresh costs a fraction of the first analysis.
+    """
+    client = get_gemini_client()
+
+    title = video_metadata.get('title', 'Unknown Title')
+    channel = video_metadata.get('channel', 'Unknown Channel')
+    comments_text = "\n".join([f"- {c}" for c in new_comments])
+
+    language_instruction = ""
+    if target_language != "Auto":
+        language_instruction = f"Please provide the output in {target_language}."
+    else:
+        language_instruction = "Please keep the output in the same language as the previous report."
+
+    prompt = f"""
+    You are an expert social media analyst. You previously wrote the vibe report below for a YouTube video.
+    New comments have been posted since then.
+    
+    **Video Title:** {title}
+    **Channel:** {channel}
+    
+    **Previous Vibe Report:**
+    {previous_report}
+    
+    **New Comments (with like counts):**
+    {comments_text}
+    
+    Update the report to reflect the new comments and return the full updated report, keeping the exact same structure and headings (Markdown).
+    {language_instruction}
+    Keep everything from the previous report that the new comments don't change. Give more weight to highly liked comments, and call out any shift in sentiment.
+    """
+
+    return _generate(client, prompt, deadline)
+
+def _generate(client, prompt, deadline=None):
     try:
+        config = None
+        if deadline is not None:
+            timeout = deadline.timeout(GEMINI_TIMEOUT, "Gemini")
+            config = types.GenerateContentConfig(
+                http_options=types.HttpOptions(timeout=int(timeout * 1000))  # milliseconds
+            )
         response = client.models.generate_content(
             model="gemini-2.5-flash-lite",
-            contents=prompt
+            contents=prompt,
+            config=config
         )
         
         usage = {}
@@ -83,5 +137,6 @@ def analyze_video(transcript, comments, video_metadata, target_language="Auto"):
     except Exception as e:
         return {
             "text": f"Error generating analysis: {e}",
-            "usage": {}
+            "usage": {},
+            "error": str(e)
         }
@@ -1,8 +1,15 @@
 import streamlit as st
 import utils
 import analysis
+import snapshots
+import comment_store
+import prefetch
+from deadline import Deadline
 import time
 
+# End-to-end time budget for one analysis (seconds)
+ANALYSIS_DEADLINE = 45
+
 # Page Config
 st.set_page_config(
     page_title="YouTube Vibe Check",
@@ -106,87 +113,153 @@ if url:
     if not video_id:
         st.error("Invalid YouTube URL. Please check and try again.")
     else:
+        # A stored snapshot lets us only process the comments added since the last run
+        snapshot = snapshots.load_snapshot(video_id)
+        if snapshot and snapshot.get("target_language") != target_language:
+            snapshot = None
+        full_rerun = False
+        if snapshot:
+            full_rerun = st.checkbox("Re-analyze from scratch", value=False)
+
+        # Start the slow network part now; by the time Analyze is clicked it's usually done
+        if not snapshot or full_rerun:
+            prefetch.prefetch(url, video_id)
+
         if st.button("Analyze Vibe ✨"):
-            with st.spinner("Fetching video data..."):
-                # 1. Get Metadata
-                metadata = None
-                try:
-                    metadata = utils.get_video_metadata(url)
-                except Exception as e:
-                    st.error(f"❌ Could not fetch video metadata.\n\n**Reason:** {e}")
-                    st.stop()
-                
-                # Display Video Info immediately
-                st.markdown(f"""
-                <div class="custom-card">
-                    <div class="video-title">{metadata['title']}</div>
-                    <div class="video-channel">{metadata['channel']}</div>
-                    <img src="{metadata['thumbnail']}" style="width: 100%; border-radius: 10px; max-height: 400px; object-fit: cover;">
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # 2. Get Transcript
-                transcript = None
-                try:
-                    transcript = utils.get_transcript(video_id)
-                except Exception as e:
-                    print(f"Transcript fetch failed: {e}")
-                    # Silently continue as requested by user
-                    st.toast("Transcript unavailable, analyzing metadata only")
-                
-                # 3. Get Comments
-                comments = []
-                try:
-                    comments = utils.get_comments(url, limit=50)
-                except Exception as e:
-                    st.warning(f"⚠️ Could not fetch comments. Analysis will be limited.\n\n**Reason:** {e}")
-                
-                if not transcript and not comments:
-                    st.warning("⚠️ Transcript and comments are unavailable. Analysis will be based on video metadata only.")
-                    # We do NOT stop here anymore, as per user request to rely on title/description.
+            if full_rerun:
+                snapshot = None
+
+            # One time budget for the whole analysis; fetches leave time for Gemini.
+            # Optional sources (transcript, comments) are skipped when it runs short.
+            deadline = Deadline(ANALYSIS_DEADLINE)
+            fetch_deadline = deadline.reserve(analysis.GEMINI_RESERVE)
+
+            # 1. Get Metadata
+            metadata = None
+            if snapshot:
+                metadata = snapshot["metadata"]
+            else:
+                with st.spinner("Fetching video data..."):
+                    try:
+                        metadata = prefetch.fetch("metadata", url, video_id, deadline=fetch_deadline)
+                    except Exception as e:
+                        st.error(f"❌ Could not fetch video metadata.\n\n**Reason:** {e}")
+                        st.stop()
             
-            with st.spinner("Consulting the oracle (Gemini)..."):
-                # 4. Analyze
-                result = analysis.analyze_video(transcript, comments, metadata, target_language=target_language)
-                analysis_text = result.get("text", "")
-                usage = result.get("usage", {})
-                
-                # Display Results
-                st.markdown("### 🔮 The Vibe Report")
-                
-                # Fix for stray </div>: Split the markdown calls
-                st.markdown('<div class="custom-card">', unsafe_allow_html=True)
-                st.markdown(analysis_text)
-                st.markdown('</div>', unsafe_allow_html=True)
-                
-                # Token & Cost Info
-                if usage:
-                    prompt_tokens = usage.get("prompt_token_count", 0)
-                    output_tokens = usage.get("candidates_token_count", 0)
-                    total_tokens = usage.get("total_token_count", 0)
+            # Display Video Info immediately
+            st.markdown(f"""
+            <div class="custom-card">
+                <div class="video-title">{metadata['title']}</div>
+                <div class="video-channel">{metadata['channel']}</div>
+                <img src="{metadata['thumbnail']}" style="width: 100%; border-radius: 10px; max-height: 400px; object-fit: cover;">
+            </div>
+            """, unsafe_allow_html=True)
+
+            if snapshot:
+                # Refresh: fetch only new comments and update the previous report
+                with st.spinner("Fetching new comments since the last run..."):
+                    try:
+                        snapshot, result, new_count = snapshots.refresh_snapshot(url, snapshot, target_language=target_language, deadline=deadline)
+                        st.toast(f"{new_count} new comments since the last run")
+                    except Exception as e:
+                        st.warning(f"⚠️ Could not fetch new comments. Showing the previous report.\n\n**Reason:** {e}")
+                        result = {"text": snapshot["report"], "usage": {}}
+                comments = utils.format_comments(snapshot["top_comments"], limit=50)
+            else:
+                with st.spinner("Fetching video data..."):
+                    # Transcript and comments are awaited together, so a slow
+                    # transcript can't use up the comments' share of the budget
+                    fetched = prefetch.fetch_many(["transcript", "comments"], url, video_id, deadline=fetch_deadline)
+
+                    # 2. Get Transcript
+                    transcript, e = fetched["transcript"]
+                    if e is not None:
+                        print(f"Transcript fetch failed: {e}")
+                        # Silently continue as requested by user
+                        st.toast("Transcript unavailable, analyzing metadata only")
                     
-                    # Cost estimation (based on Gemini 2.5 Flash pricing as a proxy/baseline)
-                    # Input: $0.10 / 1M tokens
-                    # Output: $0.40 / 1M tokens
-                    input_cost = (prompt_tokens / 1_000_000) * 0.10
-                    output_cost = (output_tokens / 1_000_000) * 0.40
-                    total_cost = input_cost + output_cost
+                    # 3. Get Comments
+                    raw_comments = None
+                    comments_complete = False
+                    comments = []
+                    try:
+                        fetched_comments, e = fetched["comments"]
+                        if e is not None:
+                            raise e
+                        fetched_comments, comments_complete = fetched_comments
+                        comments = utils.format_comments(fetched_comments, limit=50)
+                        # Only set once Gemini will actually see them, since the snapshot marks them seen
+                        raw_comments = fetched_comments
+                    except Exception as e:
+                        st.warning(f"⚠️ Could not fetch comments. Analysis will be limited.\n\n**Reason:** {e}")
+
+                    # Best effort: the store only backs later analytics
+                    if raw_comments is not None:
+                        try:
+                            comment_store.write_comments(video_id, raw_comments)
+                        except Exception as e:
+                            print(f"Comment store write failed: {e}")
+
+                    # A partial comment set needs the newest comments as the seen
+                    # boundary for later refreshes; None means don't snapshot
+                    boundary = None
+                    if raw_comments is not None:
+                        boundary = snapshots.comment_boundary(url, comments_complete, deadline=fetch_deadline)
                     
-                    st.info(f"""
-                    **Token Usage & Cost Estimate** (based on 2.5 Flash Lite rates):
-                    - Input Tokens: {prompt_tokens:,}
-                    - Output Tokens: {output_tokens:,}
-                    - Total Tokens: {total_tokens:,}
-                    - **Estimated Cost:** ${total_cost:.6f}
-                    """)
+                    if not transcript and not comments:
+                        st.warning("⚠️ Transcript and comments are unavailable. Analysis will be based on video metadata only.")
+                        # We do NOT stop here anymore, as per user request to rely on title/description.
+            
+                with st.spinner("Consulting the oracle (Gemini)..."):
+                    # 4. Analyze
+                    result = analysis.analyze_video(transcript, comments, metadata, target_language=target_language, deadline=deadline)
+
+                # Only snapshot runs with a sound seen boundary, so the next refresh has a sound baseline
+                if boundary is not None and not result.get("error"):
+                    snapshots.save_snapshot(snapshots.new_snapshot(
+                        video_id, metadata, raw_comments, result["text"],
+                        target_language=target_language, boundary=boundary
+                    ))
+
+            analysis_text = result.get("text", "")
+            usage = result.get("usage", {})
+            
+            # Display Results
+            st.markdown("### 🔮 The Vibe Report")
+            
+            # Fix for stray </div>: Split the markdown calls
+            st.markdown('<div class="custom-card">', unsafe_allow_html=True)
+            st.markdown(analysis_text)
+            st.markdown('</div>', unsafe_allow_html=True)
+            
+            # Token & Cost Info
+            if usage:
+                prompt_tokens = usage.get("prompt_token_count", 0)
+                output_tokens = usage.get("candidates_token_count", 0)
+                total_tokens = usage.get("total_token_count", 0)
+                
+                # Cost estimation (based on Gemini 2.5 Flash pricing as a proxy/baseline)
+                # Input: $0.10 / 1M tokens
+                # Output: $0.40 / 1M tokens
+                input_cost = (prompt_tokens / 1_000_000) * 0.10
+                output_cost = (output_tokens / 1_000_000) * 0.40
+                total_cost = input_cost + output_cost
                 
-                # Expander for raw data
-                with st.expander("View Raw Data"):
-                    st.subheader("Description")
-                    st.text(metadata['description'])
-                    st.subheader("Top Comments Sample")
-                    for c in comments[:5]:
-                        st.text(f"- {c}")
+                st.info(f"""
+                **Token Usage & Cost Estimate** (based on 2.5 Flash Lite rates):
+                - Input Tokens: {prompt_tokens:,}
+                - Output Tokens: {output_tokens:,}
+                - Total Tokens: {total_tokens:,}
+                - **Estimated Cost:** ${total_cost:.6f}
+                """)
+            
+            # Expander for raw data
+            with st.expander("View Raw Data"):
+                st.subheader("Description")
+                st.text(metadata['description'])
+                st.subheader("Top Comments Sample")
+                for c in comments[:5]:
+                    st.text(f"- {c}")
 
 # Footer
 st.markdown("---")
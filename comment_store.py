@@ -0,0 +1,244 @@
+"""
+Columnar on-disk comment store.
+
+One file per video, written once and memory-mapped for reads, so analytics
+(top-k, like histograms, time filters) run over typed columns instead of a
+list of Python dicts.
+
+File layout (little-endian, every column starts on an 8-byte boundary):
+    header        magic b"VIBECOL1", uint64 comment count n
+    likes         int64[n]
+    timestamps    int64[n]   (-1 when unknown)
+    uploader      uint8[n]   (1 if the author is the uploader)
+    text_offsets  int64[n+1] (byte offsets into the text blob)
+    text          utf-8 blob
+"""
+import os
+import sys
+import mmap
+import heapq
+import bisect
+import struct
+import tempfile
+from array import array
+
+# Where per-video comment stores are kept
+COMMENT_STORE_DIR = os.getenv("VIBE_COMMENT_STORE_DIR", ".vibe_comments")
+
+_MAGIC = b"VIBECOL1"
+_HEADER = struct.Struct("<8sQ")
+
+
+def _store_path(video_id):
+    return os.path.join(COMMENT_STORE_DIR, f"{video_id}.vcs")
+
+
+def _padded(n):
+    return (n + 7) & ~7
+
+
+def _layout(n):
+    """
+    Returns the byte offset of each column for a store of n comments.
+    """
+    likes = _HEADER.size
+    timestamps = likes + 8 * n
+    uploader = timestamps + 8 * n
+    text_offsets = uploader + _padded(n)
+    text = text_offsets + 8 * (n + 1)
+    return likes, timestamps, uploader, text_offsets, text
+
+
+def _le_bytes(arr):
+    if sys.byteorder != "little":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _columns(comments, text_base=0):
+    """
+    Encodes comments into column arrays. Text offsets start at text_base and
+    don't include the leading offset, so they can be appended to an existing store.
+    """
+    likes = array("q")
+    timestamps = array("q")
+    uploader = array("B")
+    text_offsets = array("q")
+    blob = bytearray()
+
+    for c in comments:
+        likes.append(int(c.get("like_count", 0) or 0))
+        ts = c.get("timestamp")
+        timestamps.append(int(ts) if ts is not None else -1)
+        uploader.append(1 if c.get("author_is_uploader") else 0)
+        blob += (c.get("text") or "").encode("utf-8")
+        text_offsets.append(text_base + len(blob))
+
+    return likes, timestamps, uploader, text_offsets, blob
+
+
+def _write_store(video_id, n, likes, timestamps, uploader, text_offsets, text):
+    """
+    Writes a store of n comments from per-column lists of little-endian byte
+    chunks, replacing any previous one atomically. The temp file is unique per
+    writer, so the app and the scheduler can write the same video at once.
+    """
+    os.makedirs(COMMENT_STORE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=COMMENT_STORE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, n))
+            for chunk in likes + timestamps + uploader:
+                f.write(chunk)
+            f.write(b"\0" * (_padded(n) - n))
+            for chunk in text_offsets + text:
+                f.write(chunk)
+        os.replace(tmp_path, _store_path(video_id))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_comments(video_id, comments):
+    """
+    Writes the normalized comments (see utils.fetch_comments) of a video to its
+    store, replacing any previous one atomically.
+    """
+    likes, timestamps, uploader, text_offsets, blob = _columns(comments)
+    _write_store(
+        video_id, len(likes),
+        [_le_bytes(likes)], [_le_bytes(timestamps)], [uploader.tobytes()],
+        [_le_bytes(array("q", [0])), _le_bytes(text_offsets)], [blob],
+    )
+
+
+def append_comments(video_id, new_comments):
+    """
+    Rewrites the store with new_comments added (stores are immutable once
+    written). The existing columns are copied byte for byte from the mapped
+    file, only the new comments are encoded. Creates the store if it doesn't
+    exist yet.
+    """
+    store = open_store(video_id)
+    if store is None:
+        write_comments(video_id, new_comments)
+        return
+    with store:
+        text_base = store.text_offsets[store.n]
+        likes, timestamps, uploader, text_offsets, blob = _columns(new_comments, text_base)
+        _write_store(
+            video_id, store.n + len(likes),
+            [store.likes, _le_bytes(likes)],
+            [store.timestamps, _le_bytes(timestamps)],
+            [store.uploader, uploader.tobytes()],
+            [store.text_offsets, _le_bytes(text_offsets)],
+            [store._text[:text_base], blob],
+        )
+
+
+def open_store(video_id):
+    """
+    Memory-maps the store of a video. Returns None if there isn't one.
+    """
+    try:
+        return CommentStore(_store_path(video_id))
+    except FileNotFoundError:
+        return None
+
+
+class CommentStore:
+    """
+    Read-only, memory-mapped view of a video's comment store.
+    Columns are exposed as memoryviews; nothing is decoded until asked for.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC:
+            self._mmap.close()
+            raise ValueError(f"Not a comment store: {path}")
+        if sys.byteorder != "little":
+            self._mmap.close()
+            raise ValueError("Comment stores can only be memory-mapped on little-endian machines")
+
+        self.n = n
+        likes, timestamps, uploader, text_offsets, text = _layout(n)
+        self._view = view = memoryview(self._mmap)
+        self.likes = view[likes:timestamps].cast("q")
+        self.timestamps = view[timestamps:uploader].cast("q")
+        self.uploader = view[uploader:uploader + n]
+        self.text_offsets = view[text_offsets:text].cast("q")
+        self._text = view[text:]
+
+    def __len__(self):
+        return self.n
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for name in ("likes", "timestamps", "uploader", "text_offsets", "_text", "_view"):
+            getattr(self, name).release()
+        self._mmap.close()
+
+    def text(self, i):
+        return bytes(self._text[self.text_offsets[i]:self.text_offsets[i + 1]]).decode("utf-8")
+
+    def comment(self, i):
+        """
+        Materializes comment i as a normalized dict.
+        """
+        ts = self.timestamps[i]
+        return {
+            "id": None,
+            "text": self.text(i),
+            "like_count": self.likes[i],
+            "timestamp": ts if ts >= 0 else None,
+            "author_is_uploader": bool(self.uploader[i]),
+            "is_pinned": False,
+        }
+
+    def top_k(self, k):
+        """
+        Indices of the k most liked comments, most liked first.
+        """
+        return heapq.nlargest(k, range(self.n), key=self.likes.__getitem__)
+
+    def between(self, start=None, end=None):
+        """
+        Indices of comments posted in [start, end) (epoch seconds).
+        Comments without a timestamp are excluded.
+        """
+        lo = 0 if start is None else start
+        hi = sys.maxsize if end is None else end
+        return [i for i, ts in enumerate(self.timestamps) if ts >= 0 and lo <= ts < hi]
+
+    def like_histogram(self, edges):
+        """
+        Counts comments per like bucket. edges is an ascending list of bucket
+        lower bounds, e.g. [0, 10, 100, 1000]; the last bucket is open-ended.
+        Comments below edges[0] are not counted.
+        """
+        counts = [0] * len(edges)
+        for likes in self.likes:
+            b = bisect.bisect_right(edges, likes) - 1
+            if b >= 0:
+                counts[b] += 1
+        return counts
+
+    def format_top(self, limit=1000):
+        """
+        Same "(Likes: N) text" strings as utils.format_comments, built from the store.
+        """
+        formatted = []
+        for i in self.top_k(limit):
+            text = self.text(i)
+            if text:
+                formatted.append(f"(Likes: {self.likes[i]}) {text}")
+        return formatted
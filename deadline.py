@@ -0,0 +1,68 @@
+"""
+End-to-end deadline for one analysis.
+
+The caller creates a Deadline for the whole pipeline and passes it down;
+every network call sizes its timeout from the time left instead of using a
+fixed value. When too little time is left for a stage, DeadlineExceeded is
+raised so the caller can skip that source and carry on with what it has.
+"""
+import time
+
+# Below this many seconds left, a network call isn't worth starting
+MIN_STAGE_TIMEOUT = 1.0
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() < MIN_STAGE_TIMEOUT
+
+    def check(self, stage):
+        """
+        Raises DeadlineExceeded if there's no time left to start `stage`.
+        """
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+    def timeout(self, cap, stage="request"):
+        """
+        Timeout for one call: the stage's usual cap, shortened to the time left.
+        """
+        self.check(stage)
+        return min(cap, self.remaining())
+
+    def reserve(self, seconds):
+        """
+        Returns a deadline that expires `seconds` earlier, to keep time back
+        for a later stage (e.g. Gemini after the fetches).
+        """
+        child = Deadline(0)
+        child.expires_at = self.expires_at - seconds
+        return child
+
+
+def timeout_for(deadline, cap, stage="request"):
+    """
+    Same as deadline.timeout(cap), but returns cap when there's no deadline.
+    """
+    if deadline is None:
+        return cap
+    return deadline.timeout(cap, stage)
+
+
+def reserve_for(deadline, seconds):
+    """
+    Same as deadline.reserve(seconds), but returns None when there's no deadline.
+    """
+    if deadline is None:
+        return None
+    return deadline.reserve(seconds)
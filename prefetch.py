@@ -0,0 +1,175 @@
+"""
+Speculative prefetch of the slow network part of an analysis.
+
+As soon as a valid video id shows up, metadata, transcript and comments start
+downloading in the background. When the user clicks Analyze, fetch() picks up
+the in-flight or finished result instead of starting over. All fetches,
+speculative or not, go through the same per-video cache, so concurrent
+requests for the same video are deduplicated.
+
+State lives at module level so it survives Streamlit reruns (and is shared
+between sessions of the same server process).
+"""
+import threading
+import time
+import concurrent.futures
+
+import utils
+from deadline import DeadlineExceeded
+
+# Background workers for metadata + transcript, and separately for comments:
+# a full comment extraction can run for minutes and mustn't starve the rest
+PREFETCH_WORKERS = 4
+COMMENT_WORKERS = 3
+# Max videos with speculative fetches still running that nobody has asked
+# for yet. Further pastes aren't prefetched so they don't burn quota.
+MAX_SPECULATIVE_VIDEOS = 3
+# How long fetched data stays reusable (seconds)
+CACHE_TTL = 10 * 60
+
+_FETCHERS = {
+    "metadata": lambda url, video_id, deadline=None: utils.get_video_metadata(url, deadline=deadline),
+    "transcript": lambda url, video_id, deadline=None: utils.get_transcript(video_id, deadline=deadline),
+    "comments": lambda url, video_id, deadline=None: utils.fetch_comments(url, deadline=deadline),
+}
+
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=PREFETCH_WORKERS)
+_comment_executor = concurrent.futures.ThreadPoolExecutor(max_workers=COMMENT_WORKERS)
+_lock = threading.Lock()
+# video_id -> {"started", "claimed", "futures": {kind: Future}}
+_entries = {}
+
+def _evict(now):
+    for video_id, entry in list(_entries.items()):
+        if now - entry["started"] < CACHE_TTL:
+            continue
+        if all(f.done() for f in entry["futures"].values()):
+            del _entries[video_id]
+
+def _submit(kind, url, video_id, deadline=None):
+    executor = _comment_executor if kind == "comments" else _executor
+    return executor.submit(_FETCHERS[kind], url, video_id, deadline)
+
+def _run_inline(future, kind, url, video_id, deadline):
+    """
+    Runs a fetch in the caller's thread and publishes it through `future`
+    (already marked running), so other callers can still wait on it.
+    """
+    try:
+        future.set_result(_FETCHERS[kind](url, video_id, deadline))
+    except Exception as e:
+        future.set_exception(e)
+    except BaseException as e:
+        # Resolve the placeholder before letting e.g. KeyboardInterrupt or a
+        # Streamlit rerun through, or every later caller would wait on it forever
+        future.set_exception(e)
+        raise
+
+def prefetch(url, video_id):
+    """
+    Starts fetching metadata, transcript and comments for a video in the
+    background. Returns False if it's already cached/in flight or the
+    speculative cap is reached.
+    """
+    with _lock:
+        now = time.time()
+        _evict(now)
+        if video_id in _entries:
+            return False
+        pending = sum(
+            1 for e in _entries.values()
+            if not e["claimed"] and not all(f.done() for f in e["futures"].values())
+        )
+        if pending >= MAX_SPECULATIVE_VIDEOS:
+            return False
+        _entries[video_id] = {
+            "started": now,
+            "claimed": False,
+            "futures": {kind: _submit(kind, url, video_id) for kind in _FETCHERS},
+        }
+        return True
+
+def _reusable(kind, future):
+    """
+    Failed fetches aren't served from cache, nor are comment sets that were
+    cut short (by a caller's deadline): those are fetched again.
+    """
+    if future.exception() is not None:
+        return False
+    if kind == "comments":
+        _, complete = future.result()
+        return complete
+    return True
+
+def _claim(kind, url, video_id, deadline):
+    """
+    Returns (future, inline) for a fetch: the prefetched future if it's usable,
+    otherwise a new one. When inline is True the caller must run it.
+    """
+    entry = _entries.get(video_id)
+    if entry is None:
+        entry = {"started": time.time(), "claimed": True, "futures": {}}
+        _entries[video_id] = entry
+    entry["claimed"] = True
+
+    future = entry["futures"].get(kind)
+    inline = False
+    # A queued (not yet started) metadata prefetch is dropped for an inline run
+    if kind == "metadata" and future is not None and future.cancel():
+        future = None
+    if future is not None and future.done() and not _reusable(kind, future):
+        future = None
+    if future is None:
+        if kind == "metadata":
+            future = concurrent.futures.Future()
+            future.set_running_or_notify_cancel()  # can't be cancelled by another caller
+            inline = True
+        else:
+            future = _submit(kind, url, video_id, deadline)
+        entry["futures"][kind] = future
+    return future, inline
+
+def fetch(kind, url, video_id, deadline=None):
+    """
+    Returns the result of a fetch ("metadata", "transcript" or "comments"),
+    waiting on the prefetched one if there is one. Failed or truncated
+    prefetches are retried rather than served from cache. Metadata is mandatory, so if its
+    prefetch is still queued behind other work it's run inline instead.
+    Raises like the underlying utils function.
+    With a `deadline`, waiting stops when it runs out (DeadlineExceeded);
+    the fetch keeps going in the background and still lands in the cache.
+    """
+    with _lock:
+        future, inline = _claim(kind, url, video_id, deadline)
+
+    if inline:
+        _run_inline(future, kind, url, video_id, deadline)
+
+    if deadline is None:
+        return future.result()
+    try:
+        return future.result(timeout=deadline.remaining())
+    except concurrent.futures.TimeoutError:
+        raise DeadlineExceeded(f"Deadline exceeded waiting for {kind}")
+
+def fetch_many(kinds, url, video_id, deadline=None):
+    """
+    Like fetch() for several optional sources at once (not "metadata"), waiting
+    on all of them together so one slow source can't eat the others' budget.
+    Returns {kind: (result, error)}; error is the exception or None.
+    """
+    with _lock:
+        futures = {kind: _claim(kind, url, video_id, deadline)[0] for kind in kinds}
+
+    timeout = None if deadline is None else deadline.remaining()
+    concurrent.futures.wait(futures.values(), timeout=timeout)
+
+    results = {}
+    for kind, future in futures.items():
+        if not future.done():
+            results[kind] = (None, DeadlineExceeded(f"Deadline exceeded waiting for {kind}"))
+        elif future.exception() is not None:
+            results[kind] = (None, future.exception())
+        else:
+            results[kind] = (future.result(), None)
+    return results
@@ -0,0 +1,322 @@
+"""
+Channel watch scheduler.
+
+Polls a set of channels for new uploads and keeps every watched video's vibe
+report fresh. Videos sit in a priority queue ordered by when they go stale;
+the stale interval shrinks with comment velocity, so hot videos are refreshed
+far more often than cold ones. All network work shares one concurrency limit
+and one rate budget.
+
+Usage:
+    python scheduler.py https://www.youtube.com/@SomeChannel [more channels...]
+    python scheduler.py --channels-file channels.txt
+"""
+import argparse
+import heapq
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import utils
+import snapshots
+from deadline import Deadline
+
+# How often each channel's upload list is polled (seconds)
+CHANNEL_POLL_INTERVAL = 15 * 60
+# How many recent uploads per channel are watched
+UPLOADS_PER_CHANNEL = 10
+
+# Refresh interval bounds (seconds). A video with no new comments drifts to
+# MAX_REFRESH_INTERVAL; the busier it is, the closer it gets to MIN.
+MIN_REFRESH_INTERVAL = 2 * 60
+MAX_REFRESH_INTERVAL = 6 * 60 * 60
+# Comments/hour at which a video's interval is halved from MAX
+VELOCITY_HALF_POINT = 5
+# Weight of the latest measurement in the velocity moving average
+VELOCITY_SMOOTHING = 0.5
+
+# Failed refreshes back off exponentially from MIN_REFRESH_INTERVAL; after
+# MAX_FAILURES in a row the video is dropped (private, removed, members-only...)
+MAX_FAILURES = 5
+
+# Global budget shared by channel polls and video refreshes (one job = one poll or one refresh)
+MAX_CONCURRENCY = 4
+MAX_JOBS_PER_MINUTE = 20
+
+# Time budget for one video refresh (seconds); it also caps how many comments
+# a first-time analysis pulls, so one job can't hold a worker indefinitely
+REFRESH_DEADLINE = 120
+
+# How often metrics are printed (seconds)
+METRICS_INTERVAL = 60
+
+
+class RateLimiter:
+    """
+    Token bucket: up to `per_minute` acquisitions per minute, with bursts of
+    at most `per_minute`.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def refresh_interval(velocity):
+    """
+    Maps comment velocity (new comments/hour) to how long a video may stay
+    unrefreshed.
+    """
+    interval = MAX_REFRESH_INTERVAL / (1 + velocity / VELOCITY_HALF_POINT)
+    return max(MIN_REFRESH_INTERVAL, min(MAX_REFRESH_INTERVAL, interval))
+
+
+class Scheduler:
+    def __init__(self, channels, target_language="Auto",
+                 max_concurrency=MAX_CONCURRENCY, jobs_per_minute=MAX_JOBS_PER_MINUTE):
+        self.channels = list(channels)
+        self.target_language = target_language
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.limiter = RateLimiter(jobs_per_minute)
+
+        # Heap of (due_at, video_id); due_at is wall-clock time
+        self.heap = []
+        # video_id -> {"url", "last_refresh", "velocity", "due_at", "failures"}
+        self.videos = {}
+        # channel_url -> next poll time
+        self.channel_due = {c: 0.0 for c in self.channels}
+        # channel_url -> video ids in its latest upload window
+        self.channel_uploads = {}
+        # Videos dropped after MAX_FAILURES; not re-watched while still listed
+        self.given_up = set()
+        self.in_flight = set()
+        # Finished jobs are handed back to the main loop through this queue
+        self.done = queue.Queue()
+
+        self.metrics = {
+            "queue_depth": 0,
+            "due_now": 0,
+            "in_flight": 0,
+            "lag_last": 0.0,
+            "lag_max": 0.0,
+            "refreshes": 0,
+            "failures": 0,
+        }
+        self._lags = []
+
+    # ---- Queue management ----
+
+    def watch(self, video_id, url):
+        if video_id in self.videos or video_id in self.given_up:
+            return
+        snapshot = snapshots.load_snapshot(video_id)
+        if snapshot:
+            last_refresh = snapshot.get("updated_at", 0.0)
+            due_at = last_refresh + MIN_REFRESH_INTERVAL
+        else:
+            # Brand new to us: analyze right away
+            last_refresh = None
+            due_at = time.time()
+        self.videos[video_id] = {"url": url, "last_refresh": last_refresh, "velocity": 0.0,
+                                 "due_at": due_at, "failures": 0}
+        heapq.heappush(self.heap, (due_at, video_id))
+
+    def unwatch(self, video_id, reason):
+        # Its heap entry goes stale and an in-flight result is ignored
+        if self.videos.pop(video_id, None) is not None:
+            print(f"[scheduler] Stopped watching {video_id}: {reason}")
+
+    def _update_uploads(self, channel_url, uploads):
+        self.channel_uploads[channel_url] = {u["video_id"] for u in uploads}
+        for upload in uploads:
+            self.watch(upload["video_id"], upload["url"])
+
+        # Drop videos that fell out of every channel's upload window
+        listed = set().union(*self.channel_uploads.values())
+        for video_id in list(self.videos):
+            if video_id not in listed:
+                self.unwatch(video_id, "no longer in the latest uploads")
+        self.given_up &= listed
+
+    def _record_failure(self, video_id):
+        video = self.videos[video_id]
+        video["failures"] += 1
+        if video["failures"] >= MAX_FAILURES:
+            self.given_up.add(video_id)
+            self.unwatch(video_id, f"{video['failures']} refreshes in a row failed")
+            return
+        # Back off without touching velocity or last_refresh
+        backoff = MIN_REFRESH_INTERVAL * 2 ** (video["failures"] - 1)
+        video["due_at"] = time.time() + min(backoff, MAX_REFRESH_INTERVAL)
+        heapq.heappush(self.heap, (video["due_at"], video_id))
+
+    def _reschedule(self, video_id, new_count):
+        video = self.videos[video_id]
+        now = time.time()
+        if video["last_refresh"] is not None and new_count is not None:
+            hours = max(now - video["last_refresh"], 1.0) / 3600
+            measured = new_count / hours
+            video["velocity"] = (VELOCITY_SMOOTHING * measured
+                                 + (1 - VELOCITY_SMOOTHING) * video["velocity"])
+        video["last_refresh"] = now
+        video["failures"] = 0
+        # A first analysis gives no velocity yet, so measure again soon
+        interval = MIN_REFRESH_INTERVAL if new_count is None else refresh_interval(video["velocity"])
+        video["due_at"] = now + interval
+        heapq.heappush(self.heap, (video["due_at"], video_id))
+
+    # ---- Jobs (run on the executor) ----
+
+    def _poll_channel(self, channel_url):
+        uploads = utils.get_channel_uploads(channel_url, limit=UPLOADS_PER_CHANNEL)
+        return ("channel", channel_url, uploads)
+
+    def _refresh_video(self, video_id):
+        url = self.videos[video_id]["url"]
+        deadline = Deadline(REFRESH_DEADLINE)
+        snapshot = snapshots.load_snapshot(video_id)
+        if snapshot and snapshot.get("target_language") == self.target_language:
+            _, _, new_count = snapshots.refresh_snapshot(url, snapshot, target_language=self.target_language, deadline=deadline)
+        else:
+            snapshot, _ = snapshots.create_snapshot(url, video_id, target_language=self.target_language, deadline=deadline)
+            if snapshot is None:
+                # Counted as a failure so retries back off instead of re-running full analyses
+                raise Exception("Snapshot not saved: no seen boundary for the partial comment set")
+            new_count = None
+        return ("video", video_id, new_count)
+
+    def _submit(self, key, fn, *args):
+        self.in_flight.add(key)
+
+        def run():
+            try:
+                self.done.put((key, fn(*args), None))
+            except Exception as e:
+                self.done.put((key, None, e))
+
+        self.executor.submit(run)
+
+    # ---- Main loop ----
+
+    def _collect(self):
+        while True:
+            try:
+                key, result, error = self.done.get_nowait()
+            except queue.Empty:
+                return
+            self.in_flight.discard(key)
+            kind, name = key
+
+            if error is not None:
+                self.metrics["failures"] += 1
+                print(f"[scheduler] {kind} {name} failed: {error}")
+                if kind == "video" and name in self.videos:
+                    self._record_failure(name)
+                continue
+
+            if kind == "channel":
+                self._update_uploads(name, result[2])
+            elif name in self.videos:
+                self.metrics["refreshes"] += 1
+                self._reschedule(name, result[2])
+
+    def _has_capacity(self):
+        return len(self.in_flight) < self.max_concurrency
+
+    def _dispatch(self):
+        now = time.time()
+
+        # Channel polls first: they're cheap and feed the queue
+        for channel_url, due_at in self.channel_due.items():
+            key = ("channel", channel_url)
+            if due_at > now or key in self.in_flight:
+                continue
+            if not self._has_capacity() or not self.limiter.try_acquire():
+                return
+            self.channel_due[channel_url] = now + CHANNEL_POLL_INTERVAL
+            self._submit(key, self._poll_channel, channel_url)
+
+        # Then the stalest videos
+        while self.heap and self.heap[0][0] <= now and self._has_capacity():
+            due_at, video_id = self.heap[0]
+            video = self.videos.get(video_id)
+            if video is None or due_at != video["due_at"] or ("video", video_id) in self.in_flight:
+                # Outdated heap entry
+                heapq.heappop(self.heap)
+                continue
+            if not self.limiter.try_acquire():
+                return
+            heapq.heappop(self.heap)
+            self._lags.append(now - due_at)
+            self._submit(("video", video_id), self._refresh_video, video_id)
+
+    def _update_metrics(self):
+        now = time.time()
+        waiting = [v for video_id, v in self.videos.items() if ("video", video_id) not in self.in_flight]
+        self.metrics["queue_depth"] = len(waiting)
+        self.metrics["due_now"] = sum(1 for v in waiting if v["due_at"] <= now)
+        self.metrics["in_flight"] = len(self.in_flight)
+        if self._lags:
+            self.metrics["lag_last"] = self._lags[-1]
+            self.metrics["lag_max"] = max(self._lags)
+            self._lags = []
+
+    def run(self, tick=1.0):
+        print(f"[scheduler] Watching {len(self.channels)} channels "
+              f"(concurrency {self.max_concurrency}, {self.limiter.capacity} jobs/min)")
+        last_metrics = 0.0
+        try:
+            while True:
+                self._collect()
+                self._dispatch()
+                if time.time() - last_metrics >= METRICS_INTERVAL:
+                    self._update_metrics()
+                    m = self.metrics
+                    print(f"[scheduler] queue_depth={m['queue_depth']} due_now={m['due_now']} "
+                          f"in_flight={m['in_flight']} lag_last={m['lag_last']:.1f}s "
+                          f"lag_max={m['lag_max']:.1f}s refreshes={m['refreshes']} failures={m['failures']}")
+                    last_metrics = time.time()
+                time.sleep(tick)
+        except KeyboardInterrupt:
+            print("[scheduler] Stopping…")
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _read_channels_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep vibe reports of channel uploads fresh.")
+    parser.add_argument("channels", nargs="*", help="Channel URLs (e.g. https://www.youtube.com/@name)")
+    parser.add_argument("--channels-file", help="File with one channel URL per line")
+    parser.add_argument("--language", default="Auto", help="Output language for reports")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--rate", type=int, default=MAX_JOBS_PER_MINUTE, help="Max jobs (polls + refreshes) per minute")
+    args = parser.parse_args()
+
+    channels = list(args.channels)
+    if args.channels_file:
+        channels += _read_channels_file(args.channels_file)
+    if not channels:
+        parser.error("No channels given.")
+
+    Scheduler(channels, target_language=args.language,
+              max_concurrency=args.concurrency, jobs_per_minute=args.rate).run()
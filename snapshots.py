@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import tempfile
+import utils
+import analysis
+import comment_store
+from deadline import reserve_for
+
+# Where per-video snapshots are kept between runs
+SNAPSHOT_DIR = os.getenv("VIBE_SNAPSHOT_DIR", ".vibe_snapshots")
+
+# How many top comments (by likes) we keep in the snapshot
+TOP_K = 50
+
+def _snapshot_path(video_id):
+    return os.path.join(SNAPSHOT_DIR, f"{video_id}.json")
+
+def load_snapshot(video_id):
+    """
+    Loads the stored snapshot for a video, or None if there isn't one (or it's unreadable).
+    """
+    try:
+        with open(_snapshot_path(video_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_snapshot(snapshot):
+    """
+    Writes the snapshot atomically so a crash mid-write never leaves a broken file.
+    The temp file is unique per writer, so the app and the scheduler can save
+    the same video concurrently (last one wins, never a half-written file).
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = _snapshot_path(snapshot["video_id"])
+    fd, tmp_path = tempfile.mkstemp(dir=SNAPSHOT_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _top_comments(comments, k=TOP_K):
+    """
+    Keeps the k most liked comments, deduplicated by key (later entries win,
+    so fresher like counts replace older ones).
+    """
+    by_key = {}
+    for c in comments:
+        by_key[utils.comment_key(c)] = c
+    ranked = sorted(by_key.values(), key=lambda x: x.get("like_count", 0) or 0, reverse=True)
+    return ranked[:k]
+
+def new_snapshot(video_id, metadata, comments, report, target_language="Auto", boundary=None):
+    """
+    Builds the snapshot after a full analysis: every comment key we've seen,
+    the top-k comments and the report.
+    If `comments` was only part of the video's comments, `boundary` must be
+    its newest comments (utils.get_newest_comments): refreshes stop at them,
+    so older comments that weren't fetched aren't later taken for new ones.
+    """
+    seen = list(comments) + list(boundary or [])
+    return {
+        "video_id": video_id,
+        "metadata": metadata,
+        "target_language": target_language,
+        "seen_keys": list(dict.fromkeys(utils.comment_key(c) for c in seen)),
+        "top_comments": _top_comments(comments),
+        "report": report,
+        "updated_at": time.time(),
+    }
+
+def _store_comments(write, video_id, comments):
+    """
+    Best-effort write to the columnar comment store: it only backs later
+    analytics, so a failure there must never cost a report.
+    """
+    try:
+        write(video_id, comments)
+    except Exception as e:
+        print(f"Comment store write failed: {e}")
+
+def comment_boundary(url, complete, deadline=None):
+    """
+    Returns the boundary new_snapshot needs: [] when the fetched comments were
+    complete, the newest comments otherwise, or None if those couldn't be
+    fetched (then no snapshot should be saved).
+    """
+    if complete:
+        return []
+    try:
+        return utils.get_newest_comments(url, deadline=deadline)
+    except Exception as e:
+        print(f"Newest comments fetch failed, not saving a snapshot: {e}")
+        return None
+
+def refresh_snapshot(url, snapshot, target_language="Auto", deadline=None):
+    """
+    Brings a snapshot up to date with the comments posted since it was taken.
+    Only the new comments are fetched, and Gemini only sees the previous report
+    plus those comments. If nothing is new, Gemini isn't called at all. If the
+    new comments can't be bridged back to the last seen one, the video is
+    re-analyzed from scratch instead.
+    With a `deadline`, the fetch leaves analysis.GEMINI_RESERVE seconds for Gemini.
+    Returns (snapshot, result, new_comment_count).
+    """
+    seen_keys = set(snapshot["seen_keys"])
+    new_comments, complete = utils.get_new_comments(url, seen_keys, deadline=reserve_for(deadline, analysis.GEMINI_RESERVE))
+
+    if not complete:
+        # Too many new comments to bridge back to the last seen one: start over
+        print(f"Gap in new comments for {snapshot['video_id']}, re-analyzing from scratch")
+        fresh, result = create_snapshot(url, snapshot["video_id"], target_language=target_language, deadline=deadline)
+        if fresh is None:
+            raise Exception("Full re-analysis couldn't store a snapshot")
+        return fresh, result, len(new_comments)
+
+    if not new_comments:
+        snapshot["updated_at"] = time.time()
+        save_snapshot(snapshot)
+        return snapshot, {"text": snapshot["report"], "usage": {}}, 0
+
+    result = analysis.update_analysis(
+        snapshot["report"],
+        utils.format_comments(new_comments, limit=TOP_K),
+        snapshot["metadata"],
+        target_language=target_language,
+        deadline=deadline,
+    )
+
+    # Only mark the comments as seen once the report actually reflects them
+    if not result.get("error"):
+        snapshot["seen_keys"].extend(utils.comment_key(c) for c in new_comments)
+        snapshot["top_comments"] = _top_comments(snapshot["top_comments"] + new_comments)
+        snapshot["report"] = result["text"]
+        snapshot["updated_at"] = time.time()
+        save_snapshot(snapshot)
+        _store_comments(comment_store.append_comments, snapshot["video_id"], new_comments)
+
+    return snapshot, result, len(new_comments)
+
+def create_snapshot(url, video_id, target_language="Auto", deadline=None):
+    """
+    Runs a full analysis (metadata, transcript, all comments) without the UI
+    and stores the resulting snapshot. Used for videos seen for the first time.
+    With a `deadline`, the transcript is skipped if time runs short and the
+    comment extraction is capped to what fits in the budget.
+    Returns (snapshot, result); snapshot is None if no sound seen boundary
+    could be stored (see comment_boundary).
+    """
+    fetch_deadline = reserve_for(deadline, analysis.GEMINI_RESERVE)
+    metadata = utils.get_video_metadata(url, deadline=fetch_deadline)
+
+    transcript = None
+    try:
+        transcript = utils.get_transcript(video_id, deadline=fetch_deadline)
+    except Exception as e:
+        print(f"Transcript fetch failed: {e}")
+
+    raw_comments, complete = utils.fetch_comments(url, deadline=fetch_deadline)
+    comments = utils.format_comments(raw_comments, limit=TOP_K)
+    _store_comments(comment_store.write_comments, video_id, raw_comments)
+    boundary = comment_boundary(url, complete, deadline=fetch_deadline)
+
+    result = analysis.analyze_video(transcript, comments, metadata, target_language=target_language, deadline=deadline)
+    if result.get("error"):
+        raise Exception(result["error"])
+
+    if boundary is None:
+        return None, result
+    snapshot = new_snapshot(video_id, metadata, raw_comments, result["text"],
+                            target_language=target_language, boundary=boundary)
+    save_snapshot(snapshot)
+    return snapshot, result
@@ -1,8 +1,10 @@
 import re
 import os
+import hashlib
 import requests
 import yt_dlp
 from youtube_transcript_api import YouTubeTranscriptApi
+from deadline import DeadlineExceeded, timeout_for
 
 # List of public Invidious instances to try
 # Prioritize instances known to have working APIs and good uptime
@@ -14,6 +16,23 @@ INVIDIOUS_INSTANCES = [
     "https://iv.ggtyler.dev" # Moved to bottom as it was returning HTML for captions
 ]
 
+# Per-call timeout caps (seconds); with a deadline they shrink to the time left
+YT_DLP_TIMEOUT = 5
+INVIDIOUS_TIMEOUT = 5
+# Conservative yt-dlp comment throughput, used to size comment fetches to a deadline
+COMMENTS_PER_SECOND = 10
+
+# Incremental comment fetching (newest first): initial window and hard cap
+NEW_COMMENTS_WINDOW = 50
+NEW_COMMENTS_MAX = 2000
+# Max comment pages (~20 comments each) read from Invidious for a full fetch
+INVIDIOUS_MAX_COMMENT_PAGES = 50
+
+# Bare channel roots: /@handle, /channel/ID, /c/name, /user/name (no tab, no query)
+CHANNEL_ROOT_PATTERN = re.compile(
+    r"^(?:https?://)?(?:www\.|m\.)?youtube\.com/(?:@[^/?#]+|(?:channel|c|user)/[^/?#]+)/?$"
+)
+
 def get_video_id(url):
     """
     Extracts the video ID from a YouTube URL.
@@ -29,19 +48,37 @@ def get_video_id(url):
         return match.group(1)
     return None
 
-def get_video_metadata(url):
+def _yt_dlp_retries(deadline, socket_timeout):
+    """
+    One retry normally; none when the deadline couldn't fit a second attempt.
+    """
+    if deadline is not None and deadline.remaining() < 2 * socket_timeout:
+        return 0
+    return 1
+
+def _comment_budget(deadline):
+    """
+    How many comments yt-dlp can page through in the time left (at least one page).
+    Only the socket timeout is otherwise bounded, so this is what keeps a full
+    comment extraction within the deadline.
+    """
+    return max(20, int(deadline.remaining() * COMMENTS_PER_SECOND))
+
+def get_video_metadata(url, deadline=None):
     """
     Fetches video metadata (title, description, channel) using yt-dlp.
     Includes User-Agent to avoid 403 on Streamlit Cloud.
     Has fallback to Invidious if yt-dlp is blocked.
+    Timeouts are sized from `deadline` (a deadline.Deadline) when given.
     """
+    socket_timeout = timeout_for(deadline, YT_DLP_TIMEOUT, "metadata")
     ydl_opts = {
         "quiet": True,
         "no_warnings": True,
         "skip_download": True,
         "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
-        "socket_timeout": 5, # Fail fast if blocked
-        "retries": 1,
+        "socket_timeout": socket_timeout, # Fail fast if blocked
+        "retries": _yt_dlp_retries(deadline, socket_timeout),
     }
 
     yt_error = None
@@ -71,7 +108,7 @@ def get_video_metadata(url):
                     import requests
                     api_url = f"{instance}/api/v1/videos/{video_id}"
                     # Short timeout to fail fast and try next
-                    r = requests.get(api_url, timeout=5)
+                    r = requests.get(api_url, timeout=timeout_for(deadline, INVIDIOUS_TIMEOUT, "metadata"))
                     if r.status_code != 200:
                          raise Exception(f"Status {r.status_code}")
                     
@@ -88,6 +125,8 @@ def get_video_metadata(url):
                         'thumbnail': data.get('videoThumbnails', [{}])[0].get('url'),
                         'duration': data.get('lengthSeconds')
                     }
+                except DeadlineExceeded:
+                    raise
                 except Exception as e:
                     last_inv_error = e
                     continue # Try next instance
@@ -95,6 +134,43 @@ def get_video_metadata(url):
             # If loop finishes without return
             raise Exception(f"Video metadata fetch failed. yt-dlp Error: {yt_error}. Invidious Fallback Error: {last_inv_error}")
 
+def get_channel_uploads(channel_url, limit=10):
+    """
+    Lists the latest uploads of a channel with yt-dlp flat playlist extraction
+    (one request, no per-video page fetch).
+    Returns a list of {"video_id", "url", "title"}, newest first.
+    """
+    # A bare channel URL resolves to its tabs; the /videos tab is the uploads list.
+    # Anything else (/streams, /shorts, playlists, query strings) is used as given.
+    if CHANNEL_ROOT_PATTERN.match(channel_url):
+        channel_url = channel_url.rstrip("/") + "/videos"
+
+    ydl_opts = {
+        "quiet": True,
+        "no_warnings": True,
+        "skip_download": True,
+        "extract_flat": "in_playlist",
+        "playlistend": limit,
+        "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
+        "socket_timeout": YT_DLP_TIMEOUT, # Fail fast if blocked
+        "retries": 1,
+    }
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(channel_url, download=False)
+
+    uploads = []
+    for entry in info.get("entries") or []:
+        video_id = entry.get("id")
+        if not video_id:
+            continue
+        uploads.append({
+            "video_id": video_id,
+            "url": f"https://www.youtube.com/watch?v={video_id}",
+            "title": entry.get("title"),
+        })
+    return uploads[:limit]
+
 def _parse_webvtt(vtt_content):
     """
     Parses WebVTT content to extract just the text.
@@ -134,13 +210,14 @@ def _parse_webvtt(vtt_content):
             
     return " ".join(text_lines)
 
-def get_transcript(video_id):
+def get_transcript(video_id, deadline=None):
     """
     Fetches the transcript of the video.
     Priority:
     1. youtube-transcript-api (standard)
     2. youtube-transcript-api (with cookies.txt if available)
     3. Invidious API (captions fallback)
+    With a `deadline`, methods that no longer fit in the time left are skipped.
     """
     
     # --- Attempt 1 & 2: youtube-transcript-api (Standard + Cookies) ---
@@ -159,6 +236,10 @@ def get_transcript(video_id):
         attempts.append(("Cookies", cookies_file))
         
     for name, cookie_path in attempts:
+        # youtube-transcript-api takes no timeout, so all we can do is not start it late
+        if deadline is not None and deadline.expired():
+            exceptions.append(f"Method '{name}' skipped: deadline exceeded")
+            continue
         try:
             # Note: We need to re-instantiate for each attempt to clear state if any
             api = YouTubeTranscriptApi()
@@ -206,7 +287,7 @@ def get_transcript(video_id):
             
             # Add User-Agent to avoid blocking
             headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
-            r = requests.get(api_url, headers=headers, timeout=5)
+            r = requests.get(api_url, headers=headers, timeout=timeout_for(deadline, INVIDIOUS_TIMEOUT, "transcript"))
             if r.status_code != 200:
                 raise Exception(f"Status {r.status_code}")
                 
@@ -222,6 +303,9 @@ def get_transcript(video_id):
                  
             return full_text
             
+        except DeadlineExceeded as e:
+            last_inv_error = e
+            break
         except Exception as e:
             last_inv_error = e
             continue
@@ -232,11 +316,47 @@ def get_transcript(video_id):
     final_error = "\n".join(exceptions)
     raise Exception(f"All transcript fetch methods failed.\n{final_error}")
 
-def get_comments(url, limit=1000):
+def comment_key(comment):
     """
-    Scrapes the top comments.
+    Returns a stable key for a comment: its YouTube id, or a hash of the text
+    when the source didn't give us one.
+    """
+    if comment.get("id"):
+        return comment["id"]
+    text = comment.get("text") or ""
+    return "sha1:" + hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def _normalize_yt_dlp_comment(c):
+    return {
+        "id": c.get("id"),
+        "text": c.get("text"),
+        "like_count": c.get("like_count", 0) or 0,
+        "timestamp": c.get("timestamp"),
+        "author_is_uploader": bool(c.get("author_is_uploader")),
+        "is_pinned": bool(c.get("is_pinned")),
+    }
+
+def _normalize_invidious_comment(c):
+    return {
+        "id": c.get("commentId"),
+        "text": c.get("content"),
+        "like_count": c.get("likes", 0) or 0,
+        "timestamp": c.get("published"),
+        "author_is_uploader": bool(c.get("authorIsChannelOwner")),
+        "is_pinned": bool(c.get("isPinned")),
+    }
+
+def fetch_comments(url, deadline=None):
+    """
+    Fetches the raw comments of a video as normalized dicts
+    (id, text, like_count, timestamp, author_is_uploader, is_pinned).
     Falls back to Invidious if yt-dlp is blocked (403).
+    Timeouts are sized from `deadline` when given, and yt-dlp is capped to the
+    comments that fit in it.
+    Returns (comments, complete); complete is False when only part of the
+    comments came back (capped by the deadline, or more pages left).
     """
+    socket_timeout = timeout_for(deadline, YT_DLP_TIMEOUT, "comments")
     ydl_opts = {
         "quiet": True,
         "no_warnings": True,
@@ -244,18 +364,25 @@ def get_comments(url, limit=1000):
         "getcomments": True,
         "playlist_items": "0",
         "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
-        "socket_timeout": 5, # Fail fast if blocked
-        "retries": 1,
+        "socket_timeout": socket_timeout, # Fail fast if blocked
+        "retries": _yt_dlp_retries(deadline, socket_timeout),
     }
+    budget = None
+    if deadline is not None:
+        budget = _comment_budget(deadline)
+        ydl_opts["extractor_args"] = {"youtube": {"max_comments": [str(budget)]}}
     
     yt_error = None
     comments = None
+    complete = True
 
     # ---- First try yt-dlp ----
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         try:
             info = ydl.extract_info(url, download=False)
-            comments = info.get("comments", [])
+            comments = [_normalize_yt_dlp_comment(c) for c in info.get("comments") or []]
+            # Hitting the cap means yt-dlp stopped early (default sort is "top")
+            complete = budget is None or len(comments) < budget
         except Exception as e:
             yt_error = str(e)
             comments = None
@@ -265,23 +392,40 @@ def get_comments(url, limit=1000):
         last_inv_error = None
         for instance in INVIDIOUS_INSTANCES:
             try:
-                import requests
                 video_id = get_video_id(url)
                 api_url = f"{instance}/api/v1/comments/{video_id}"
-                r = requests.get(api_url, timeout=5) # fast timeout
-                if r.status_code != 200:
-                    raise Exception(f"Status {r.status_code}")
-                
-                try:
-                    data = r.json()
-                except:
-                    raise Exception("Response was not JSON")
+                page_comments = []
+                continuation = None
+                pages = 0
+                # Page through continuations; a failure after the first page keeps what we have
+                while True:
+                    try:
+                        params = {"continuation": continuation} if continuation else None
+                        timeout = timeout_for(deadline, INVIDIOUS_TIMEOUT, "comments")
+                        r = requests.get(api_url, params=params, timeout=timeout) # fast timeout
+                        if r.status_code != 200:
+                            raise Exception(f"Status {r.status_code}")
+                        
+                        try:
+                            data = r.json()
+                        except:
+                            raise Exception("Response was not JSON")
+                    except Exception:
+                        if not page_comments:
+                            raise
+                        break
+
+                    page_comments.extend(_normalize_invidious_comment(c) for c in data.get("comments", []))
+                    continuation = data.get("continuation")
+                    pages += 1
+                    if not continuation or pages >= INVIDIOUS_MAX_COMMENT_PAGES:
+                        break
     
-                comments = [
-                    {"text": c.get("content"), "like_count": c.get("likes")}
-                    for c in data.get("comments", [])
-                ]
+                comments = page_comments
+                complete = not continuation
                 break # Success
+            except DeadlineExceeded:
+                raise
             except Exception as e2:
                 last_inv_error = e2
                 continue
@@ -289,9 +433,134 @@ def get_comments(url, limit=1000):
         if comments is None:
              raise Exception(f"Comments fetch failed. yt-dlp Error: {yt_error}. Invidious Fallback Error: {last_inv_error}")
 
-    # ---- Sort → format → return ----
-    if comments:
-        comments.sort(key=lambda x: x.get("like_count", 0) or 0, reverse=True)
+    return comments, complete
+
+def _take_until_seen(batch, seen_keys):
+    """
+    Walks a newest-first batch of comments and returns (new_comments, reached),
+    where reached is True once we hit a comment we've already seen.
+    Pinned comments sit on top regardless of date, so they never stop the walk.
+    """
+    new_comments = []
+    for c in batch:
+        key = comment_key(c)
+        if key in seen_keys:
+            if c.get("is_pinned"):
+                continue
+            return new_comments, True
+        new_comments.append(c)
+    return new_comments, False
+
+def get_new_comments(url, seen_keys, max_comments=NEW_COMMENTS_MAX, deadline=None):
+    """
+    Fetches only the comments posted since the last run.
+    Comments are requested newest-first and we stop as soon as we reach one
+    whose key is in seen_keys. yt-dlp can't be stopped mid-stream, so it is
+    asked for a small window first and the window grows only if the last seen
+    comment wasn't in it.
+    Falls back to Invidious (paged with continuations) if yt-dlp is blocked.
+    Returns (new_comments, complete); complete is False when max_comments
+    were read without reaching a seen comment, i.e. there's a gap before the
+    last seen one and the caller should re-analyze from scratch.
+    Timeouts and the yt-dlp window are sized from `deadline` when given; if
+    the budget can't reach the last seen comment, DeadlineExceeded is raised.
+    """
+    yt_error = None
+    window = min(NEW_COMMENTS_WINDOW, max_comments)
+
+    # ---- First try yt-dlp ----
+    while True:
+        socket_timeout = timeout_for(deadline, YT_DLP_TIMEOUT, "new comments")
+        fetch_size = window if deadline is None else min(window, _comment_budget(deadline))
+        ydl_opts = {
+            "quiet": True,
+            "no_warnings": True,
+            "skip_download": True,
+            "getcomments": True,
+            "playlist_items": "0",
+            "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
+            "socket_timeout": socket_timeout, # Fail fast if blocked
+            "retries": _yt_dlp_retries(deadline, socket_timeout),
+            # Newest first, top-level comments only
+            "extractor_args": {"youtube": {
+                "comment_sort": ["new"],
+                "max_comments": [str(fetch_size), "all", "0"],
+            }},
+        }
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            try:
+                info = ydl.extract_info(url, download=False)
+            except Exception as e:
+                yt_error = str(e)
+                break
+
+        batch = [
+            _normalize_yt_dlp_comment(c)
+            for c in info.get("comments") or []
+            if c.get("parent", "root") == "root"
+        ]
+        new_comments, reached = _take_until_seen(batch, seen_keys)
+        if reached or len(batch) < fetch_size:
+            return new_comments, True
+        if fetch_size < window:
+            raise DeadlineExceeded("Deadline exceeded before reaching the last seen comment")
+        if window >= max_comments:
+            return new_comments, False
+        window = min(window * 4, max_comments)
+
+    # ---- Fallback to Invidious (Multi-Instance) ----
+    video_id = get_video_id(url)
+    last_inv_error = None
+    for instance in INVIDIOUS_INSTANCES:
+        try:
+            new_comments = []
+            continuation = None
+            reached = False
+            while len(new_comments) < max_comments:
+                params = {"sort_by": "new"}
+                if continuation:
+                    params["continuation"] = continuation
+                api_url = f"{instance}/api/v1/comments/{video_id}"
+                timeout = timeout_for(deadline, INVIDIOUS_TIMEOUT, "new comments")
+                r = requests.get(api_url, params=params, timeout=timeout) # fast timeout
+                if r.status_code != 200:
+                    raise Exception(f"Status {r.status_code}")
+
+                try:
+                    data = r.json()
+                except:
+                    raise Exception("Response was not JSON")
+
+                batch = [_normalize_invidious_comment(c) for c in data.get("comments", [])]
+                page_new, reached = _take_until_seen(batch, seen_keys)
+                new_comments.extend(page_new)
+                continuation = data.get("continuation")
+                if reached or not continuation:
+                    break
+            complete = reached or not continuation
+            return new_comments[:max_comments], complete
+        except DeadlineExceeded:
+            raise
+        except Exception as e2:
+            last_inv_error = e2
+            continue
+
+    raise Exception(f"New comments fetch failed. yt-dlp Error: {yt_error}. Invidious Fallback Error: {last_inv_error}")
+
+def get_newest_comments(url, limit=NEW_COMMENTS_WINDOW, deadline=None):
+    """
+    Fetches the `limit` newest top-level comments. When the full comment set
+    couldn't be fetched, their keys mark where "new" starts for the next
+    incremental refresh.
+    """
+    comments, _ = get_new_comments(url, set(), max_comments=limit, deadline=deadline)
+    return comments
+
+def format_comments(comments, limit=1000):
+    """
+    Sorts comments by likes and formats them as "(Likes: N) text" for the prompt.
+    """
+    comments = sorted(comments, key=lambda x: x.get("like_count", 0) or 0, reverse=True)
 
     formatted = []
     for c in comments[:limit]:
@@ -300,4 +569,12 @@ def get_comments(url, limit=1000):
         if text:
             formatted.append(f"(Likes: {likes}) {text}")
 
-    return formatted
\ No newline at end of file
+    return formatted
+
+def get_comments(url, limit=1000, deadline=None):
+    """
+    Scrapes the top comments.
+    Falls back to Invidious if yt-dlp is blocked (403).
+    """
+    comments, _ = fetch_comments(url, deadline=deadline)
+    return format_comments(comments, limit=limit)